@@ -1,11 +1,19 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 from pathlib import Path
-import json, re
+from collections import deque
+import hashlib, json, orjson, re, time
 
-app = FastAPI(title="CHROMAX ST Demo — Clean Rebuild")
+class OrjsonResponse(Response):
+    """JSON responses rendered by orjson (C, straight to bytes)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+app = FastAPI(title="CHROMAX ST Demo — Clean Rebuild", default_response_class=OrjsonResponse)
 
 DATA_FILE = Path("chromax_demo_data.json")
 
@@ -15,8 +23,8 @@ DATA_FILE = Path("chromax_demo_data.json")
 # BOTTOM: R18–R8 | OUTPUT -> UNLOAD -> LOAD
 # OUTPUT is directly before UNLOAD
 # =========================================================
-TOP_ROW = [f"R{i}" for i in range(1, 8)] + [f"W{i}" for i in range(1, 6)] + ["OVEN"]
-BOTTOM_ROW = [f"R{i}" for i in range(18, 7, -1)] + ["OUTPUT", "UNLOAD", "LOAD"]
+TOP_ROW = tuple([f"R{i}" for i in range(1, 8)] + [f"W{i}" for i in range(1, 6)] + ["OVEN"])
+BOTTOM_ROW = tuple([f"R{i}" for i in range(18, 7, -1)] + ["OUTPUT", "UNLOAD", "LOAD"])
 ALL_SLOTS = TOP_ROW + BOTTOM_ROW
 SLOT_POS = {s: i for i, s in enumerate(ALL_SLOTS)}
 
@@ -46,8 +54,30 @@ def safe_write(data: Dict[str, Any]) -> None:
     DATA_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
 SEVERITY = {"OK": 1, "WARN": 2, "BLOCK": 3}
-def bump(cur: str, new: str) -> str:
-    return new if SEVERITY[new] > SEVERITY[cur] else cur
+_SEV_NAMES = ("OK", "WARN", "BLOCK")  # index = severity - 1
+
+# =========================================================
+# Audit trail (in-memory)
+# Timestamps are stored as raw time.time() floats; formatting
+# happens lazily in /api/audit, which only tails 200 entries.
+# The deque bound keeps memory flat in long-running processes.
+# =========================================================
+class AuditEntry:
+    __slots__ = ("seq", "t", "event", "details")
+
+    def __init__(self, seq: int, event: str, details: Dict[str, Any]):
+        self.seq = seq
+        self.t = time.time()
+        self.event = event
+        self.details = details
+
+AUDIT: deque = deque(maxlen=4096)
+_audit_seq = 0  # monotonically increasing; lets clients fetch incrementally
+
+def audit_log(event: str, details: Optional[Dict[str, Any]] = None) -> None:
+    global _audit_seq
+    _audit_seq += 1
+    AUDIT.append(AuditEntry(_audit_seq, event, details or {}))
 
 # =========================================================
 # Classes (fixed colors) + default reagents
@@ -79,15 +109,15 @@ DEFAULT_REAGENTS: Dict[str, Dict[str, str]] = {
     "LOAD":   {"id":"LOAD","name":"Load","class_id":"IO","override_color":""},
 }
 
+# default reagent per slot, resolved once; default_layout only copies
+_DEFAULT_SLOT_REAGENTS: Dict[str, str] = {s: "EMPTY" for s in ALL_SLOTS}
+for _w in ("W1","W2","W3","W4","W5"):
+    _DEFAULT_SLOT_REAGENTS[_w] = "H2O"
+for _io in ("OVEN","OUTPUT","UNLOAD","LOAD"):
+    _DEFAULT_SLOT_REAGENTS[_io] = _io
+
 def default_layout() -> Dict[str, Dict[str, str]]:
-    lay = {s: {"reagent_id": "EMPTY"} for s in ALL_SLOTS}
-    for w in ("W1","W2","W3","W4","W5"):
-        lay[w] = {"reagent_id": "H2O"}
-    lay["OVEN"] = {"reagent_id": "OVEN"}
-    lay["OUTPUT"] = {"reagent_id": "OUTPUT"}
-    lay["UNLOAD"] = {"reagent_id": "UNLOAD"}
-    lay["LOAD"] = {"reagent_id": "LOAD"}
-    return lay
+    return {s: {"reagent_id": rid} for s, rid in _DEFAULT_SLOT_REAGENTS.items()}
 
 DEFAULT_PROGRAMS: Dict[str, Dict[str, Any]] = {
     "H&E": {"steps": [
@@ -112,18 +142,19 @@ STATE: Dict[str, Any] = {
     "last_check": None,
 }
 
+# /api/check memoization: checks are pure in STATE, so a cached result
+# stays valid until some endpoint mutates state and bumps the version
+_state_version = 0
+_check_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+
+def state_touched() -> None:
+    global _state_version, _check_cache
+    _state_version += 1
+    _check_cache = None
+
 def persist():
-    safe_write({
-        "classes": STATE["classes"],
-        "reagents": STATE["reagents"],
-        "layout": STATE["layout"],
-        "programs": STATE["programs"],
-        "selected_program": STATE["selected_program"],
-        "selected_for_run": STATE["selected_for_run"],
-        "w_mode": STATE["w_mode"],
-        "water_flow_l_min": STATE["water_flow_l_min"],
-        "last_check": STATE["last_check"],
-    })
+    # STATE holds exactly the persisted keys -> no copy needed
+    safe_write(STATE)
 
 def load_persisted():
     data = safe_read()
@@ -226,8 +257,10 @@ persist()
 def reagent_of_slot(slot: str) -> str:
     return (STATE["layout"].get(slot) or {}).get("reagent_id", "EMPTY")
 
+_EMPTY_REAGENT = {"id":"EMPTY","name":"Empty","class_id":"EMPTY","override_color":""}
+
 def reagent_info(reagent_id: str) -> Dict[str, str]:
-    return STATE["reagents"].get(reagent_id) or {"id":"EMPTY","name":"Empty","class_id":"EMPTY","override_color":""}
+    return STATE["reagents"].get(reagent_id) or _EMPTY_REAGENT
 
 def reagent_class(reagent_id: str) -> str:
     return (reagent_info(reagent_id).get("class_id") or "OTHER").upper()
@@ -248,27 +281,63 @@ def slot_kind(slot: str) -> str:
 # =========================================================
 # Rules
 # =========================================================
-WATER_STEPS = {"rinse", "water", "wash"}
-OVEN_STEPS  = {"oven", "bake", "dry"}
-
-STEP_ALLOWED_CLASSES: Dict[str, List[str]] = {
-    "rinse": ["WATER"], "water": ["WATER"], "wash": ["WATER"],
-    "hematoxylin": ["HEMATOXYLIN", "OTHER"],
-    "eosin":       ["EOSIN", "OTHER"],
-    "dehydrate":   ["ALCOHOL", "OTHER"],
-    "clear":       ["XYLENE", "CLEARING", "OTHER"],
-    "deparaffinization": ["XYLENE", "CLEARING", "OTHER"],
-    "custom_step": ["OTHER","ALCOHOL","XYLENE","CLEARING","HEMATOXYLIN","EOSIN","WATER","EMPTY"],
+WATER_STEPS = frozenset({"rinse", "water", "wash"})
+OVEN_STEPS  = frozenset({"oven", "bake", "dry"})
+
+STEP_ALLOWED_CLASSES: Dict[str, Tuple[str, ...]] = {
+    "rinse": ("WATER",), "water": ("WATER",), "wash": ("WATER",),
+    "hematoxylin": ("HEMATOXYLIN", "OTHER"),
+    "eosin":       ("EOSIN", "OTHER"),
+    "dehydrate":   ("ALCOHOL", "OTHER"),
+    "clear":       ("XYLENE", "CLEARING", "OTHER"),
+    "deparaffinization": ("XYLENE", "CLEARING", "OTHER"),
+    "custom_step": ("OTHER","ALCOHOL","XYLENE","CLEARING","HEMATOXYLIN","EOSIN","WATER","EMPTY"),
 }
 
-def check_layout_water_rules(findings: List[Dict[str, Any]]) -> str:
-    overall = "OK"
+class StepRule(NamedTuple):
+    kind: str                      # "water" | "oven" | "class"
+    allowed: Optional[frozenset]   # class whitelist, None for water/oven
+
+# one lookup per step decides which rule branch applies (water/oven/class)
+_STEP_RULES: Dict[str, StepRule] = {}
+for _n in OVEN_STEPS:
+    _STEP_RULES[_n] = StepRule("oven", None)
+for _n in WATER_STEPS:
+    _STEP_RULES[_n] = StepRule("water", None)
+for _n, _allowed in STEP_ALLOWED_CLASSES.items():
+    _STEP_RULES.setdefault(_n, StepRule("class", frozenset(_allowed)))
+
+# constant part of every finding, keyed by code; details (and the
+# program tag in check_multi) are attached when a finding fires
+_FINDING_BASE: Dict[str, Dict[str, str]] = {
+    "W-FLOW": {"code":"W-FLOW","level":"WARN","message":"Water flow < 8 L/min: ggf. Wash-Zeit verlängern."},
+    "E-NOTFOUND": {"code":"E-NOTFOUND","level":"BLOCK","message":"Program not found"},
+    "W-EMPTY": {"code":"W-EMPTY","level":"WARN","message":"Programm hat keine Steps"},
+    "E-STEP-NAME": {"code":"E-STEP-NAME","level":"BLOCK","message":"Leerer Step-Name"},
+    "E-SLOT": {"code":"E-SLOT","level":"BLOCK","message":"Ungültiger Slot"},
+    "W-TIME": {"code":"W-TIME","level":"WARN","message":"time_sec <= 0"},
+    "E-REVERSE": {"code":"E-REVERSE","level":"BLOCK","message":"Rückwärtsbewegung im Protokoll (nicht erlaubt)."},
+    "E-OVEN-SLOT": {"code":"E-OVEN-SLOT","level":"BLOCK","message":"Oven-Step muss auf OVEN liegen."},
+    "E-OVEN-COUNT": {"code":"E-OVEN-COUNT","level":"BLOCK","message":"OVEN darf nur einmal pro Protokoll vorkommen."},
+    "E-WATER-KIND": {"code":"E-WATER-KIND","level":"BLOCK","message":"Water-Step muss auf Wasserstation liegen (W1/W2 müssen WATER-Mode sein)."},
+    "E-WATER-CLASS": {"code":"E-WATER-CLASS","level":"BLOCK","message":"Water-Step erfordert WATER-Klasse im Bad."},
+    "E-WATER-STEP-REAGENT": {"code":"E-WATER-STEP-REAGENT","level":"BLOCK","message":"Water-Step darf nur WATER-Reagenz referenzieren."},
+    "E-STEP-REAGENT-NOTFOUND": {"code":"E-STEP-REAGENT-NOTFOUND","level":"BLOCK","message":"Step-Reagenz existiert nicht."},
+    "E-STEP-REAGENT-MISMATCH": {"code":"E-STEP-REAGENT-MISMATCH","level":"BLOCK","message":"Step verlangt ein anderes Reagenz als im Badlayout belegt ist."},
+    "W-EMPTY-SLOT": {"code":"W-EMPTY-SLOT","level":"WARN","message":"Slot ist EMPTY – bitte Bad belegen."},
+    "E-CLASS": {"code":"E-CLASS","level":"BLOCK","message":"Reagenzklasse passt nicht zum Step."},
+    "E-EXACT-CONFLICT": {"code":"E-EXACT-CONFLICT","level":"BLOCK","message":"Exact-Station-Konflikt zwischen Protokollen."},
+    "E-REVERSE-CONFLICT": {"code":"E-REVERSE-CONFLICT","level":"BLOCK","message":"Reihenfolge-Konflikt (Stationsreihenfolge unterschiedlich)."},
+}
+
+def check_layout_water_rules(findings: List[Dict[str, Any]]) -> int:
+    overall_sev = 1
     for w in ("W3","W4","W5"):
         if slot_class(w) != "WATER":
             findings.append({"code":"E-WATER-FIXED","level":"BLOCK",
                              "message":f"{w} muss WATER-Klasse sein (fixes Wasserbad).",
                              "details":{"slot":w,"reagent":reagent_of_slot(w),"class":slot_class(w)}})
-            overall = bump(overall,"BLOCK")
+            overall_sev = 3
 
     for w in ("W1","W2"):
         mode = (STATE["w_mode"].get(w) or "WATER").upper()
@@ -276,27 +345,32 @@ def check_layout_water_rules(findings: List[Dict[str, Any]]) -> str:
             findings.append({"code":"E-W12-WATERMODE","level":"BLOCK",
                              "message":f"{w} ist WATER-Mode und muss WATER enthalten.",
                              "details":{"slot":w,"mode":mode,"reagent":reagent_of_slot(w),"class":slot_class(w)}})
-            overall = bump(overall,"BLOCK")
+            overall_sev = 3
 
-    if float(STATE.get("water_flow_l_min") or 0) < 8.0:
-        findings.append({"code":"W-FLOW","level":"WARN",
-                         "message":"Water flow < 8 L/min: ggf. Wash-Zeit verlängern.",
-                         "details":{"water_flow_l_min":STATE.get("water_flow_l_min")}})
-        overall = bump(overall,"WARN")
-    return overall
+    # water_flow_l_min is cast to float at every write site (default,
+    # /api/waterflow, load_persisted) -> no re-cast needed here
+    if STATE["water_flow_l_min"] < 8.0:
+        findings.append({**_FINDING_BASE["W-FLOW"], "details":{"water_flow_l_min":STATE["water_flow_l_min"]}})
+        overall_sev = max(overall_sev, 2)
+    return overall_sev
 
 def check_program(program_name: str) -> Dict[str, Any]:
     p = STATE["programs"].get(program_name)
     findings: List[Dict[str, Any]] = []
-    overall = "OK"
+    append = findings.append
+    overall_sev = 1
+    # locals for the hot loop: LOAD_FAST beats repeated global lookups
+    slot_pos = SLOT_POS
+    step_rules = _STEP_RULES
+    fbase = _FINDING_BASE
     if not p:
         return {"program": program_name, "overall":"BLOCK",
-                "findings":[{"code":"E-NOTFOUND","level":"BLOCK","message":"Program not found","details":{}}]}
+                "findings":[{**fbase["E-NOTFOUND"], "details":{}}]}
 
     steps = p.get("steps") or []
     if not steps:
-        findings.append({"code":"W-EMPTY","level":"WARN","message":"Programm hat keine Steps","details":{}})
-        overall = bump(overall,"WARN")
+        append({**fbase["W-EMPTY"], "details":{}})
+        overall_sev = max(overall_sev, 2)
 
     last_pos = -1
     oven_count = 0
@@ -308,145 +382,150 @@ def check_program(program_name: str) -> Dict[str, Any]:
         t = int(s.get("time_sec") or 0)
 
         if not name:
-            findings.append({"code":"E-STEP-NAME","level":"BLOCK","message":"Leerer Step-Name","details":{"step":idx}})
-            overall = bump(overall,"BLOCK")
+            append({**fbase["E-STEP-NAME"], "details":{"step":idx}})
+            overall_sev = 3
             continue
-        if slot not in SLOT_POS:
-            findings.append({"code":"E-SLOT","level":"BLOCK","message":"Ungültiger Slot","details":{"step":idx,"slot":slot}})
-            overall = bump(overall,"BLOCK")
+        if slot not in slot_pos:
+            append({**fbase["E-SLOT"], "details":{"step":idx,"slot":slot}})
+            overall_sev = 3
             continue
         if t <= 0:
-            findings.append({"code":"W-TIME","level":"WARN","message":"time_sec <= 0","details":{"step":idx,"time_sec":t}})
-            overall = bump(overall,"WARN")
+            append({**fbase["W-TIME"], "details":{"step":idx,"time_sec":t}})
+            overall_sev = max(overall_sev, 2)
 
-        pos = SLOT_POS[slot]
+        pos = slot_pos[slot]
         if pos < last_pos:
-            findings.append({"code":"E-REVERSE","level":"BLOCK",
-                             "message":"Rückwärtsbewegung im Protokoll (nicht erlaubt).",
-                             "details":{"step":idx,"slot":slot,"pos":pos,"previous_pos":last_pos}})
-            overall = bump(overall,"BLOCK")
+            append({**fbase["E-REVERSE"], "details":{"step":idx,"slot":slot,"pos":pos,"previous_pos":last_pos}})
+            overall_sev = 3
         last_pos = max(last_pos,pos)
 
+        # resolve the slot's layout reagent/class once; several checks below need it
+        rid_layout = reagent_of_slot(slot)
+        layout_class = reagent_class(rid_layout)
+
+        sr = step_rules.get(name)
+        kind = sr.kind if sr is not None else None
+
         # oven
-        if name in OVEN_STEPS:
+        if kind == "oven":
             if slot != "OVEN":
-                findings.append({"code":"E-OVEN-SLOT","level":"BLOCK",
-                                 "message":"Oven-Step muss auf OVEN liegen.",
-                                 "details":{"step":idx,"slot":slot}})
-                overall = bump(overall,"BLOCK")
+                append({**fbase["E-OVEN-SLOT"], "details":{"step":idx,"slot":slot}})
+                overall_sev = 3
             oven_count += 1
             if oven_count > 1:
-                findings.append({"code":"E-OVEN-COUNT","level":"BLOCK",
-                                 "message":"OVEN darf nur einmal pro Protokoll vorkommen.",
-                                 "details":{"step":idx}})
-                overall = bump(overall,"BLOCK")
+                append({**fbase["E-OVEN-COUNT"], "details":{"step":idx}})
+                overall_sev = 3
 
         # water steps
-        if name in WATER_STEPS:
-            if slot_kind(slot) != "water":
-                findings.append({"code":"E-WATER-KIND","level":"BLOCK",
-                                 "message":"Water-Step muss auf Wasserstation liegen (W1/W2 müssen WATER-Mode sein).",
-                                 "details":{"step":idx,"slot":slot,"slot_kind":slot_kind(slot),"w_mode":STATE.get("w_mode")}})
-                overall = bump(overall,"BLOCK")
-            if slot_class(slot) != "WATER":
-                findings.append({"code":"E-WATER-CLASS","level":"BLOCK",
-                                 "message":"Water-Step erfordert WATER-Klasse im Bad.",
-                                 "details":{"step":idx,"slot":slot,"reagent":reagent_of_slot(slot),"class":slot_class(slot)}})
-                overall = bump(overall,"BLOCK")
+        elif kind == "water":
+            sk = slot_kind(slot)
+            if sk != "water":
+                append({**fbase["E-WATER-KIND"], "details":{"step":idx,"slot":slot,"slot_kind":sk,"w_mode":STATE.get("w_mode")}})
+                overall_sev = 3
+            if layout_class != "WATER":
+                append({**fbase["E-WATER-CLASS"], "details":{"step":idx,"slot":slot,"reagent":rid_layout,"class":layout_class}})
+                overall_sev = 3
             # if step explicitly wants a reagent -> must be H2O or WATER class
-            if rid_step and reagent_class(rid_step) != "WATER":
-                findings.append({"code":"E-WATER-STEP-REAGENT","level":"BLOCK",
-                                 "message":"Water-Step darf nur WATER-Reagenz referenzieren.",
-                                 "details":{"step":idx,"reagent_id":rid_step,"class":reagent_class(rid_step)}})
-                overall = bump(overall,"BLOCK")
+            if rid_step:
+                rc = reagent_class(rid_step)
+                if rc != "WATER":
+                    append({**fbase["E-WATER-STEP-REAGENT"], "details":{"step":idx,"reagent_id":rid_step,"class":rc}})
+                    overall_sev = 3
 
         # explicit reagent check: if reagent_id is set, slot layout must match it
         if rid_step:
             if rid_step not in STATE["reagents"]:
-                findings.append({"code":"E-STEP-REAGENT-NOTFOUND","level":"BLOCK",
-                                 "message":"Step-Reagenz existiert nicht.",
-                                 "details":{"step":idx,"reagent_id":rid_step}})
-                overall = bump(overall,"BLOCK")
+                append({**fbase["E-STEP-REAGENT-NOTFOUND"], "details":{"step":idx,"reagent_id":rid_step}})
+                overall_sev = 3
             else:
-                rid_layout = reagent_of_slot(slot)
                 if rid_layout != rid_step:
-                    findings.append({"code":"E-STEP-REAGENT-MISMATCH","level":"BLOCK",
-                                     "message":"Step verlangt ein anderes Reagenz als im Badlayout belegt ist.",
-                                     "details":{"step":idx,"slot":slot,"wanted":rid_step,"layout":rid_layout}})
-                    overall = bump(overall,"BLOCK")
+                    append({**fbase["E-STEP-REAGENT-MISMATCH"], "details":{"step":idx,"slot":slot,"wanted":rid_step,"layout":rid_layout}})
+                    overall_sev = 3
 
         # class compatibility (for known steps)
-        allowed = STEP_ALLOWED_CLASSES.get(name)
-        if allowed and name not in WATER_STEPS and name not in OVEN_STEPS:
-            sc = slot_class(slot)
+        if kind == "class":
+            allowed = sr.allowed
+            sc = layout_class
             if sc == "EMPTY":
-                findings.append({"code":"W-EMPTY-SLOT","level":"WARN",
-                                 "message":"Slot ist EMPTY – bitte Bad belegen.",
-                                 "details":{"step":idx,"slot":slot}})
-                overall = bump(overall,"WARN")
+                append({**fbase["W-EMPTY-SLOT"], "details":{"step":idx,"slot":slot}})
+                overall_sev = max(overall_sev, 2)
             elif sc not in allowed:
-                findings.append({"code":"E-CLASS","level":"BLOCK",
-                                 "message":"Reagenzklasse passt nicht zum Step.",
-                                 "details":{"step":idx,"name":name,"slot":slot,"slot_class":sc,"allowed":allowed}})
-                overall = bump(overall,"BLOCK")
-
-    return {"program": program_name, "overall": overall, "findings": findings}
-
-def exact_station_conflict(a: List[Dict[str, Any]], b: List[Dict[str, Any]]) -> List[str]:
-    ax = set(s.get("slot") for s in a if s.get("exact") and s.get("slot") in SLOT_POS)
-    bx = set(s.get("slot") for s in b if s.get("exact") and s.get("slot") in SLOT_POS)
-    return sorted(list(ax.intersection(bx)))
-
-def reverse_order_conflict(a: List[Dict[str, Any]], b: List[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
-    ao = [s.get("slot") for s in a if s.get("slot") in SLOT_POS]
-    bo = [s.get("slot") for s in b if s.get("slot") in SLOT_POS]
-    common = [x for x in ao if x in set(bo)]
-    for i in range(len(common)):
-        for j in range(i+1, len(common)):
-            x, y = common[i], common[j]
-            if ao.index(x) < ao.index(y) and bo.index(x) > bo.index(y):
-                return (x, y)
-            if ao.index(x) > ao.index(y) and bo.index(x) < bo.index(y):
-                return (x, y)
+                append({**fbase["E-CLASS"], "details":{"step":idx,"name":name,"slot":slot,"slot_class":sc,"allowed":STEP_ALLOWED_CLASSES[name]}})
+                overall_sev = 3
+
+    return {"program": program_name, "overall": _SEV_NAMES[overall_sev - 1], "findings": findings}
+
+# per-program inputs for the conflict checks; check_multi computes these
+# once per program instead of once per pair
+def exact_slots(steps: List[Dict[str, Any]]) -> set:
+    return {s.get("slot") for s in steps if s.get("exact") and s.get("slot") in SLOT_POS}
+
+def slot_sequence(steps: List[Dict[str, Any]]) -> List[str]:
+    return [s.get("slot") for s in steps if s.get("slot") in SLOT_POS]
+
+def first_positions(seq: List[str]) -> Dict[str, int]:
+    pos: Dict[str, int] = {}
+    for i, x in enumerate(seq):
+        pos.setdefault(x, i)
+    return pos
+
+def exact_station_conflict(ax: set, bx: set) -> List[str]:
+    return sorted(ax.intersection(bx))
+
+def reverse_order_conflict(ao: List[str], bpos: Dict[str, int]) -> Optional[Tuple[str, str]]:
+    # walk the common slots in a-order: any drop in b-position is an inversion,
+    # so one O(n) pass replaces the old pairwise scan
+    seen = set()
+    prev_slot: Optional[str] = None
+    prev_b = -1
+    for x in ao:
+        if x not in bpos or x in seen:
+            continue
+        seen.add(x)
+        pb = bpos[x]
+        if pb < prev_b:
+            return (prev_slot, x)
+        prev_b = pb
+        prev_slot = x
     return None
 
 def check_multi(selected: List[str]) -> Dict[str, Any]:
-    overall = "OK"
     findings: List[Dict[str, Any]] = []
     per_program: List[Dict[str, Any]] = []
 
-    overall = bump(overall, check_layout_water_rules(findings))
+    overall_sev = check_layout_water_rules(findings)
 
     for p in selected:
         r = check_program(p)
         per_program.append(r)
-        overall = bump(overall, r["overall"])
+        overall_sev = max(overall_sev, SEVERITY[r["overall"]])
         for f in r["findings"]:
             findings.append({**f, "program": p})
 
+    # derive every program's conflict inputs once instead of per pair
+    programs = STATE["programs"]
+    steps_by_program = {p: (programs.get(p) or {}).get("steps") or [] for p in selected}
+    exact_by_program = {p: exact_slots(steps_by_program[p]) for p in selected}
+    seq_by_program = {p: slot_sequence(steps_by_program[p]) for p in selected}
+    pos_by_program = {p: first_positions(seq_by_program[p]) for p in selected}
+
     for i in range(len(selected)):
         for j in range(i+1, len(selected)):
             p1, p2 = selected[i], selected[j]
-            s1 = (STATE["programs"].get(p1) or {}).get("steps") or []
-            s2 = (STATE["programs"].get(p2) or {}).get("steps") or []
 
-            ex = exact_station_conflict(s1, s2)
+            ex = exact_station_conflict(exact_by_program[p1], exact_by_program[p2])
             if ex:
-                findings.append({"code":"E-EXACT-CONFLICT","level":"BLOCK",
-                                 "message":"Exact-Station-Konflikt zwischen Protokollen.",
-                                 "details":{"program_1":p1,"program_2":p2,"stations":ex},
+                findings.append({**_FINDING_BASE["E-EXACT-CONFLICT"], "details":{"program_1":p1,"program_2":p2,"stations":ex},
                                  "program": f"{p1} + {p2}"})
-                overall = bump(overall, "BLOCK")
+                overall_sev = 3
 
-            rev = reverse_order_conflict(s1, s2)
+            rev = reverse_order_conflict(seq_by_program[p1], pos_by_program[p2])
             if rev:
-                findings.append({"code":"E-REVERSE-CONFLICT","level":"BLOCK",
-                                 "message":"Reihenfolge-Konflikt (Stationsreihenfolge unterschiedlich).",
-                                 "details":{"program_1":p1,"program_2":p2,"stations":[rev[0], rev[1]]},
+                findings.append({**_FINDING_BASE["E-REVERSE-CONFLICT"], "details":{"program_1":p1,"program_2":p2,"stations":[rev[0], rev[1]]},
                                  "program": f"{p1} + {p2}"})
-                overall = bump(overall, "BLOCK")
+                overall_sev = 3
 
-    out = {"overall": overall, "findings": findings, "per_program": per_program, "selected": selected}
+    out = {"overall": _SEV_NAMES[overall_sev - 1], "findings": findings, "per_program": per_program, "selected": selected}
     STATE["last_check"] = out
     persist()
     return out
@@ -457,6 +536,8 @@ def check_multi(selected: List[str]) -> Dict[str, Any]:
 class LayoutSaveReq(BaseModel):
     layout: Dict[str, str]
 
+_LAYOUT_SAVE_ADAPTER = TypeAdapter(LayoutSaveReq)
+
 class WModeReq(BaseModel):
     W1: str
     W2: str
@@ -496,6 +577,10 @@ class ProgramSaveReq(BaseModel):
     name: str
     steps: List[StepModel]
 
+# parses the raw body straight through pydantic-core (no FastAPI
+# per-field dependency resolution, no intermediate json.loads)
+_PROGRAM_SAVE_ADAPTER = TypeAdapter(ProgramSaveReq)
+
 # =========================================================
 # API Endpoints
 # =========================================================
@@ -515,14 +600,20 @@ def api_state():
     }
 
 @app.post("/api/layout/save")
-def api_layout_save(req: LayoutSaveReq):
+async def api_layout_save(request: Request):
+    try:
+        req = _LAYOUT_SAVE_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        return OrjsonResponse({"ok": False, "error": str(e)}, status_code=422)
     for slot, rid in req.layout.items():
         if slot not in STATE["layout"]:
-            return JSONResponse({"ok": False, "error": f"Unknown slot {slot}"}, status_code=400)
+            return OrjsonResponse({"ok": False, "error": f"Unknown slot {slot}"}, status_code=400)
         rid2 = (rid or "EMPTY").upper()
         if rid2 not in STATE["reagents"]:
             rid2 = "EMPTY"
         STATE["layout"][slot]["reagent_id"] = rid2
+    state_touched()
+    audit_log("layout_save", {"slots": len(req.layout)})
     persist()
     return {"ok": True}
 
@@ -531,18 +622,20 @@ def api_wmode(req: WModeReq):
     w1 = (req.W1 or "WATER").upper()
     w2 = (req.W2 or "WATER").upper()
     if w1 not in ("WATER","REAGENT") or w2 not in ("WATER","REAGENT"):
-        return JSONResponse({"ok": False, "error": "W1/W2 must be WATER or REAGENT"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "W1/W2 must be WATER or REAGENT"}, status_code=400)
     STATE["w_mode"]["W1"] = w1
     STATE["w_mode"]["W2"] = w2
+    state_touched()
+    audit_log("wmode", {"W1": w1, "W2": w2})
     persist()
     return {"ok": True}
 
 @app.post("/api/waterflow")
 def api_waterflow(req: WaterFlowReq):
-    try:
-        STATE["water_flow_l_min"] = float(req.water_flow_l_min)
-    except Exception:
-        return JSONResponse({"ok": False, "error": "Invalid water_flow_l_min"}, status_code=400)
+    # req.water_flow_l_min is already a float: pydantic coerced it on parse
+    STATE["water_flow_l_min"] = req.water_flow_l_min
+    state_touched()
+    audit_log("waterflow", {"water_flow_l_min": STATE["water_flow_l_min"]})
     persist()
     return {"ok": True}
 
@@ -550,16 +643,18 @@ def api_waterflow(req: WaterFlowReq):
 def api_reagent_upsert(req: ReagentUpsertReq):
     rid = (req.reagent_id or "").strip().upper()
     if not is_valid_id(rid):
-        return JSONResponse({"ok": False, "error": "Invalid reagent_id"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Invalid reagent_id"}, status_code=400)
     cid = (req.class_id or "OTHER").strip().upper()
     if cid not in STATE["classes"]:
-        return JSONResponse({"ok": False, "error": f"Unknown class_id {cid}"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": f"Unknown class_id {cid}"}, status_code=400)
     STATE["reagents"][rid] = {
         "id": rid,
         "name": (req.name or rid).strip() or rid,
         "class_id": cid,
         "override_color": clamp_hex(req.override_color or ""),
     }
+    state_touched()
+    audit_log("reagent_upsert", {"reagent_id": rid})
     persist()
     return {"ok": True}
 
@@ -567,9 +662,9 @@ def api_reagent_upsert(req: ReagentUpsertReq):
 def api_reagent_delete(req: ReagentDeleteReq):
     rid = (req.reagent_id or "").strip().upper()
     if rid in ("EMPTY","H2O","OVEN","OUTPUT","UNLOAD","LOAD"):
-        return JSONResponse({"ok": False, "error": "Core reagent cannot be deleted"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Core reagent cannot be deleted"}, status_code=400)
     if rid not in STATE["reagents"]:
-        return JSONResponse({"ok": False, "error": "Not found"}, status_code=404)
+        return OrjsonResponse({"ok": False, "error": "Not found"}, status_code=404)
     for slot in STATE["layout"]:
         if STATE["layout"][slot]["reagent_id"] == rid:
             STATE["layout"][slot]["reagent_id"] = "EMPTY"
@@ -579,6 +674,8 @@ def api_reagent_delete(req: ReagentDeleteReq):
             if (s.get("reagent_id") or "").upper() == rid:
                 s["reagent_id"] = ""
     del STATE["reagents"][rid]
+    state_touched()
+    audit_log("reagent_delete", {"reagent_id": rid})
     persist()
     return {"ok": True}
 
@@ -586,11 +683,13 @@ def api_reagent_delete(req: ReagentDeleteReq):
 def api_program_create(req: ProgramCreateReq):
     name = (req.name or "").strip()
     if not name:
-        return JSONResponse({"ok": False, "error": "Name required"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Name required"}, status_code=400)
     if name in STATE["programs"]:
-        return JSONResponse({"ok": False, "error": "Already exists"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Already exists"}, status_code=400)
     STATE["programs"][name] = {"steps": []}
     STATE["selected_program"] = name
+    state_touched()
+    audit_log("program_create", {"name": name})
     persist()
     return {"ok": True}
 
@@ -598,13 +697,15 @@ def api_program_create(req: ProgramCreateReq):
 def api_program_delete(req: ProgramDeleteReq):
     name = (req.name or "").strip()
     if name not in STATE["programs"]:
-        return JSONResponse({"ok": False, "error": "Not found"}, status_code=404)
+        return OrjsonResponse({"ok": False, "error": "Not found"}, status_code=404)
     if len(STATE["programs"]) <= 1:
-        return JSONResponse({"ok": False, "error": "Cannot delete last program"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Cannot delete last program"}, status_code=400)
     del STATE["programs"][name]
     if STATE["selected_program"] == name:
         STATE["selected_program"] = sorted(STATE["programs"].keys())[0]
     STATE["selected_for_run"] = [x for x in STATE["selected_for_run"] if x != name] or [STATE["selected_program"]]
+    state_touched()
+    audit_log("program_delete", {"name": name})
     persist()
     return {"ok": True}
 
@@ -612,32 +713,39 @@ def api_program_delete(req: ProgramDeleteReq):
 def api_program_select(req: ProgramSelectReq):
     name = (req.name or "").strip()
     if name not in STATE["programs"]:
-        return JSONResponse({"ok": False, "error": "Not found"}, status_code=404)
+        return OrjsonResponse({"ok": False, "error": "Not found"}, status_code=404)
     STATE["selected_program"] = name
     persist()
     return {"ok": True}
 
 @app.post("/api/program/save")
-def api_program_save(req: ProgramSaveReq):
+async def api_program_save(request: Request):
+    try:
+        req = _PROGRAM_SAVE_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        return OrjsonResponse({"ok": False, "error": str(e)}, status_code=422)
     name = (req.name or "").strip()
     if name not in STATE["programs"]:
-        return JSONResponse({"ok": False, "error": "Not found"}, status_code=404)
+        return OrjsonResponse({"ok": False, "error": "Not found"}, status_code=404)
 
-    # sanitize steps (reagent_id optional)
+    # sanitize steps (reagent_id optional); time_sec/exact are already
+    # typed by StepModel, no re-coercion needed
     steps = []
     for s in req.steps:
         rid = (s.reagent_id or "").strip().upper()
         if rid and rid not in STATE["reagents"]:
             rid = ""
         steps.append({
-            "name": (s.name or "").strip(),
-            "slot": (s.slot or "").strip(),
+            "name": s.name.strip(),
+            "slot": s.slot.strip(),
             "reagent_id": rid,
-            "time_sec": int(s.time_sec),
-            "exact": bool(s.exact),
+            "time_sec": s.time_sec,
+            "exact": s.exact,
         })
 
     STATE["programs"][name] = {"steps": steps}
+    state_touched()
+    audit_log("program_save", {"name": name, "steps": len(steps)})
     persist()
     return {"ok": True}
 
@@ -645,25 +753,54 @@ def api_program_save(req: ProgramSaveReq):
 def api_run_select(req: RunSelectReq):
     selected = [x for x in req.selected if isinstance(x, str) and x in STATE["programs"]][:3]
     if not selected:
-        return JSONResponse({"ok": False, "error": "Select at least 1"}, status_code=400)
+        return OrjsonResponse({"ok": False, "error": "Select at least 1"}, status_code=400)
     STATE["selected_for_run"] = selected
+    state_touched()
+    audit_log("run_select", {"selected": selected})
     persist()
     return {"ok": True}
 
 @app.post("/api/check")
 def api_check():
-    return check_multi(STATE["selected_for_run"])
+    global _check_cache
+    audit_log("check", {"selected": list(STATE["selected_for_run"])})
+    if _check_cache is not None and _check_cache[0] == _state_version:
+        return _check_cache[1]
+    out = check_multi(STATE["selected_for_run"])
+    _check_cache = (_state_version, out)
+    return out
+
+@app.get("/api/audit")
+def api_audit(since: int = 0):
+    # ?since=<seq> returns only newer entries; default stays the last 200
+    if since > 0:
+        entries = [e for e in AUDIT if e.seq > since]
+    else:
+        entries = list(AUDIT)[-200:]
+    return {"entries": [{
+        "seq": e.seq,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.t)),
+        "event": e.event,
+        "details": e.details,
+    } for e in entries]}
 
 # =========================================================
 # UI
 # =========================================================
 @app.get("/", response_class=HTMLResponse)
-def ui():
-    return HTMLResponse(_UI_HTML)
+def ui(request: Request):
+    # _UI_HTML is static -> serve the bytes encoded once at import,
+    # and let browsers revalidate via ETag (304 skips the body entirely)
+    if request.headers.get("if-none-match") == _UI_ETAG:
+        return Response(status_code=304, headers={"ETag": _UI_ETAG})
+    return Response(content=_UI_BYTES, media_type="text/html",
+                    headers={"ETag": _UI_ETAG, "Cache-Control": "public, max-age=300"})
+
+_HEALTH_PAYLOAD = {"ok": True, "device": "CHROMAX ST demo"}
 
 @app.get("/health")
 def health():
-    return {"ok": True, "device": "CHROMAX ST demo"}
+    return _HEALTH_PAYLOAD
 
 _UI_HTML = """<!doctype html>
 <html>
@@ -1116,3 +1253,6 @@ loadState();
 </script>
 </body>
 </html>"""
+
+_UI_BYTES = _UI_HTML.encode("utf-8")
+_UI_ETAG = f'"{hashlib.md5(_UI_BYTES).hexdigest()}"'